@@ -8,21 +8,58 @@ from PySide6.QtWidgets import (
     QComboBox,
     QSizePolicy,
 )
-from PySide6.QtCore import Qt, Signal, Slot, QTimer
-from midi.midi_manager import MidiManager
+from PySide6.QtCore import Qt, Signal, Slot, QTimer, QThreadPool, QStringListModel
+from gui.workers import PortEnumWorker, PortCloseWorker
+from gui.widgets import MidiComboBox
+from contextlib import contextmanager
+import sys
 import time
 import mido
 
+# Shared size policy for the fixed-width MIDI combos
+_FIXED_POLICY = QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+
+
+@contextmanager
+def _batched_update(combo: QComboBox):
+    """Suppress signals and repaints on a combo box while it is rebuilt."""
+    combo.blockSignals(True)
+    combo.setUpdatesEnabled(False)
+    try:
+        yield combo
+    finally:
+        combo.setUpdatesEnabled(True)
+        combo.blockSignals(False)
+
+
+def _set_port_model(combo: QComboBox, placeholder: str, ports: list[str]):
+    """
+    Replace the combo's items with ports in a single model swap. The
+    placeholder is not an item; it is shown while nothing is selected.
+    """
+    combo.setPlaceholderText(placeholder)
+    # The previous model is parented to the combo, so setModel deletes it
+    combo.setModel(QStringListModel(ports, combo))
+    combo.setCurrentIndex(-1)
+
+
+def _format_port_list(ports: list[str]) -> str:
+    if not ports:
+        return "  (none)\n"
+    return "".join(f"  - {name}\n" for name in ports)
+
 class MainWindow(QMainWindow):
     midi_hit = Signal(int, int)
+
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Drum MIDI App (Skeleton)")
         self.resize(1200, 800)
 
-        # Backend objects
-        self.midi_manager = MidiManager()
+        # Backend objects; MidiManager is built off the GUI thread
+        # (see _start_midi_init) so the window paints right away
+        self.midi_manager = None
 
         # Recording
         self.is_recording = False
@@ -37,12 +74,43 @@ class MainWindow(QMainWindow):
         # Connect signal to slot for visual updates
         self.midi_hit.connect(self._on_midi_hit_visual)
 
+        # Debounce combo changes so only the final selection opens a port
+        self._pending_out_name: str | None = None
+        self._out_debounce = QTimer(self)
+        self._out_debounce.setSingleShot(True)
+        self._out_debounce.setInterval(150)
+        self._out_debounce.timeout.connect(self._apply_output_change)
+
+        self._pending_in_name: str | None = None
+        self._in_debounce = QTimer(self)
+        self._in_debounce.setSingleShot(True)
+        self._in_debounce.setInterval(150)
+        self._in_debounce.timeout.connect(self._apply_input_change)
+
+        # Coalesce status text updates into at most one paint per frame
+        self._pending_text: str | None = None
+        self._text_timer = QTimer(self)
+        self._text_timer.setSingleShot(True)
+        self._text_timer.setInterval(16)
+        self._text_timer.timeout.connect(self._flush_status)
+
+        # Drain queued MIDI input on the GUI thread
+        self._drain_timer = QTimer(self)
+        self._drain_timer.setInterval(5)
+        self._drain_timer.timeout.connect(self._drain_midi)
+
         # UI setup
         self._create_central_widget()
         self._connect_signals()
 
-        # MIDI check / logging
-        self._log_available_midi_ports()
+        # MIDI ports are enumerated lazily (dropdown open / Refresh MIDI)
+        self._port_worker = None
+        # Port lists currently shown in the combos (None = not populated)
+        self._last_out_ports: list[str] | None = None
+        self._last_in_ports: list[str] | None = None
+
+        self._init_worker = None
+        self._start_midi_init()
 
     def _create_central_widget(self):
         central = QWidget(self)
@@ -61,15 +129,14 @@ class MainWindow(QMainWindow):
         self.record_button.setCheckable(True)  # toggle on/off
 
         # MIDI input selector
-        self.input_combo = QComboBox()
+        self.input_combo = MidiComboBox(self._populate_midi_inputs)
 
         # MIDI output selector
-        self.output_combo = QComboBox()
+        self.output_combo = MidiComboBox(self._populate_midi_outputs)
 
         # Set Size Policy
-        policy = QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
-        self.input_combo.setSizePolicy(policy)
-        self.output_combo.setSizePolicy(policy)
+        self.input_combo.setSizePolicy(_FIXED_POLICY)
+        self.output_combo.setSizePolicy(_FIXED_POLICY)
 
         self.input_combo.setFixedWidth(200)
         self.output_combo.setFixedWidth(200)
@@ -111,10 +178,6 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(central)
 
-        # Fill MIDI combos
-        self._refresh_midi_outputs()
-        self._refresh_midi_inputs()
-
     def _connect_signals(self):
         # Transport
         self.play_button.clicked.connect(self._on_play_clicked)
@@ -127,79 +190,180 @@ class MainWindow(QMainWindow):
         self.test_note_button.clicked.connect(self._on_test_note_clicked)
         self.refresh_midi_button.clicked.connect(self._on_refresh_midi_clicked)
 
-    # MIDI combo population
-
-    def _refresh_midi_outputs(self):
-        """Fill the output combo box with available MIDI output ports."""
-        ports = self.midi_manager.list_output_ports()
-
-        self.output_combo.blockSignals(True)
-        self.output_combo.clear()
-
-        if not ports:
-            # No outputs at all
-            self.output_combo.addItem("No MIDI outputs")
-            self.output_combo.setEnabled(False)
-            self.test_note_button.setEnabled(False)
-        else:
-            # Placeholder + real ports
-            self.output_combo.addItem("Select MIDI Output")
-            # visually "placeholder-ish" (optional; doesn't affect logic)
-            self.output_combo.setItemData(0, 0, Qt.UserRole - 1)
+    def closeEvent(self, event):
+        # Stop timers that touch MIDI, then close ports in the background
+        # so the window closes immediately. main() waits for the pool.
+        self._drain_timer.stop()
+        self._out_debounce.stop()
+        self._in_debounce.stop()
+        for timer in self.playback_timers:
+            timer.stop()
 
-            self.output_combo.addItems(ports)
+        if self.midi_manager is not None:
+            ports = self.midi_manager.detach_ports()
+            if ports:
+                QThreadPool.globalInstance().start(PortCloseWorker(ports))
+
+        super().closeEvent(event)
+
+    # MIDI setup
+
+    def _start_midi_init(self):
+        """Construct the MidiManager on a worker thread."""
+        for combo in (self.output_combo, self.input_combo):
+            with _batched_update(combo):
+                _set_port_model(combo, "Initializing MIDI...", [])
+                combo.setEnabled(False)
+        self.test_note_button.setEnabled(False)
+        self.refresh_midi_button.setEnabled(False)
+
+        self._init_worker = PortEnumWorker(list_ports=False)
+        signals = self._init_worker.signals
+        signals.manager_ready.connect(self._on_midi_manager_ready)
+        signals.manager_failed.connect(self._on_midi_manager_failed)
+        QThreadPool.globalInstance().start(self._init_worker)
+
+    @Slot(object)
+    def _on_midi_manager_ready(self, midi_manager):
+        # Runs on the GUI thread (queued from PortEnumWorker)
+        self._init_worker = None
+        self.midi_manager = midi_manager
+
+        # Placeholders only; ports are listed when a dropdown is opened
+        with _batched_update(self.input_combo):
+            _set_port_model(self.input_combo, "Select MIDI Input", [])
+            self.input_combo.setEnabled(True)
+        with _batched_update(self.output_combo):
+            _set_port_model(self.output_combo, "Select MIDI Output", [])
             self.output_combo.setEnabled(True)
-            self.test_note_button.setEnabled(True)
-
-            # Always start on placeholder, not first real port
-            self.output_combo.setCurrentIndex(0)
-
-        self.output_combo.blockSignals(False)
-
-    def _refresh_midi_inputs(self):
-        """Fill the input combo box with available MIDI input ports."""
-        ports = self.midi_manager.list_input_ports()
-
-        self.input_combo.blockSignals(True)
-        self.input_combo.clear()
-
-        if not ports:
-            # No inputs at all
-            self.input_combo.addItem("No MIDI inputs")
-            self.input_combo.setEnabled(False)
-        else:
-            # Placeholder + real ports
-            self.input_combo.addItem("Select MIDI Input")
-            self.input_combo.setItemData(0, 0, Qt.UserRole - 1)
+        self.test_note_button.setEnabled(True)
+        self.refresh_midi_button.setEnabled(True)
+
+        self._drain_timer.start()
+
+    @Slot(str)
+    def _on_midi_manager_failed(self, error: str):
+        # Runs on the GUI thread; Refresh MIDI retries the initialization
+        self._init_worker = None
+        for combo in (self.output_combo, self.input_combo):
+            with _batched_update(combo):
+                _set_port_model(combo, "MIDI unavailable", [])
+        self.refresh_midi_button.setEnabled(True)
+        self._set_status(
+            f"Failed to initialize MIDI:\n{error}\n"
+            "Use 'Refresh MIDI' to try again."
+        )
 
-            self.input_combo.addItems(ports)
-            self.input_combo.setEnabled(True)
+    # MIDI combo population
 
-            # Always start on placeholder, not first real port
-            self.input_combo.setCurrentIndex(0)
+    def _start_port_scan(self):
+        """Enumerate MIDI ports off the GUI thread."""
+        # Keep the current combo models so an unchanged port list
+        # doesn't rebuild them; just lock the controls while scanning.
+        self.output_combo.setEnabled(False)
+        self.input_combo.setEnabled(False)
+        self.test_note_button.setEnabled(False)
+        self.refresh_midi_button.setEnabled(False)
+
+        self._port_worker = PortEnumWorker(self.midi_manager)
+        self._port_worker.signals.ports_ready.connect(self._on_ports_ready)
+        QThreadPool.globalInstance().start(self._port_worker)
+
+    @Slot(list, list)
+    def _on_ports_ready(self, out_ports: list, in_ports: list):
+        # Runs on the GUI thread (queued from PortEnumWorker)
+        self._port_worker = None
+        self.refresh_midi_button.setEnabled(True)
+
+        # Stale handles are dropped here, not on the worker, since playback
+        # and select_output use them on this thread
+        self.midi_manager.drop_stale_outputs()
+        self.midi_manager.drop_stale_input()
+
+        # Both return early (no rebuild) if the list is unchanged
+        self._refresh_midi_outputs(out_ports)
+        self._refresh_midi_inputs(in_ports)
+
+        # Undo the scan lock, including when nothing was rebuilt
+        self.output_combo.setEnabled(bool(out_ports))
+        self.test_note_button.setEnabled(bool(out_ports))
+        self.input_combo.setEnabled(bool(in_ports))
+
+        self._set_status(
+            "Refreshed MIDI ports.\n"
+        )
 
-        self.input_combo.blockSignals(False)
+        # May replace the text above when no ports were found
+        self._log_available_midi_ports(out_ports, in_ports)
 
-    def _log_available_midi_ports(self):
-        out_ports = self.midi_manager.list_output_ports()
-        in_ports = self.midi_manager.list_input_ports()
+    def _populate_midi_outputs(self):
+        # Called right before the output dropdown opens; the port cache
+        # keeps repeated opens cheap.
+        ports = self.midi_manager.list_output_ports()
+        self.midi_manager.drop_stale_outputs()
+        self._refresh_midi_outputs(ports)
 
-        print("MIDI outputs:")
-        if not out_ports:
-            print("  (none)")
-        else:
-            for name in out_ports:
-                print(f"  - {name}")
+    def _populate_midi_inputs(self):
+        # Called right before the input dropdown opens
+        ports = self.midi_manager.list_input_ports()
+        self.midi_manager.drop_stale_input()
+        self._refresh_midi_inputs(ports)
 
-        print("MIDI inputs:")
-        if not in_ports:
-            print("  (none)")
-        else:
-            for name in in_ports:
-                print(f"  - {name}")
+    def _refresh_midi_outputs(self, ports: list[str]):
+        """Fill the output combo box with the given MIDI output ports."""
+        # Nothing changed; keep the existing model and selection
+        if ports == self._last_out_ports:
+            return
+        self._last_out_ports = list(ports)
+
+        with _batched_update(self.output_combo):
+            if not ports:
+                # No outputs at all
+                _set_port_model(self.output_combo, "No MIDI outputs", [])
+                self.output_combo.setEnabled(False)
+                self.test_note_button.setEnabled(False)
+            else:
+                _set_port_model(self.output_combo, "Select MIDI Output", ports)
+                self.output_combo.setEnabled(True)
+                self.test_note_button.setEnabled(True)
+
+            # Keep showing the open port, otherwise the placeholder
+            name = self.midi_manager.current_output_name
+            if name in ports:
+                self.output_combo.setCurrentIndex(ports.index(name))
+
+    def _refresh_midi_inputs(self, ports: list[str]):
+        """Fill the input combo box with the given MIDI input ports."""
+        # Nothing changed; keep the existing model and selection
+        if ports == self._last_in_ports:
+            return
+        self._last_in_ports = list(ports)
+
+        with _batched_update(self.input_combo):
+            if not ports:
+                # No inputs at all
+                _set_port_model(self.input_combo, "No MIDI inputs", [])
+                self.input_combo.setEnabled(False)
+            else:
+                _set_port_model(self.input_combo, "Select MIDI Input", ports)
+                self.input_combo.setEnabled(True)
+
+            # Keep showing the open port, otherwise the placeholder
+            name = self.midi_manager.current_input_name
+            if name in ports:
+                self.input_combo.setCurrentIndex(ports.index(name))
+
+    def _log_available_midi_ports(self, out_ports: list[str], in_ports: list[str]):
+        # One write instead of one print per port
+        sys.stdout.write(
+            "MIDI outputs:\n"
+            + _format_port_list(out_ports)
+            + "MIDI inputs:\n"
+            + _format_port_list(in_ports)
+        )
 
         if not out_ports and not in_ports:
-            self.placeholder_label.setText(
+            self._set_status(
                 "No MIDI inputs or outputs found.\n"
                 "(Is a virtual or hardware MIDI device available?)"
             )
@@ -209,17 +373,30 @@ class MainWindow(QMainWindow):
                 "Select In/Out at the top and use 'Test Note'."
             )
 
+    # Status text
+
+    def _set_status(self, text: str):
+        """Show text in the main area on the next timer tick (last one wins)."""
+        self._pending_text = text
+        if not self._text_timer.isActive():
+            self._text_timer.start()
+
+    def _flush_status(self):
+        if self._pending_text is not None:
+            self.placeholder_label.setText(self._pending_text)
+            self._pending_text = None
+
     # Handlers / slots
 
     def _on_play_clicked(self):
         print("Play clicked")
 
         if not self.recorded_messages:
-            self.placeholder_label.setText("Nothing to play.")
+            self._set_status("Nothing to play.")
             return
 
-        if self.midi_manager.current_output is None:
-            self.placeholder_label.setText("No MIDI output selected.")
+        if self.midi_manager is None or self.midi_manager.current_output is None:
+            self._set_status("No MIDI output selected.")
             return
 
         # Clear any leftover timers just in case
@@ -232,12 +409,15 @@ class MainWindow(QMainWindow):
         for t, msg in self.recorded_messages:
             timer = QTimer(self)
             timer.setSingleShot(True)
-            timer.timeout.connect(lambda m=msg: self.midi_manager.send_message(m))
+            # Encode once up front; the timer only sends raw bytes
+            timer.timeout.connect(
+                lambda data=msg.bytes(): self.midi_manager.send_raw(data)
+            )
             timer.start(int(t * 1000))
 
             self.playback_timers.append(timer)
 
-        self.placeholder_label.setText("Playing back...")
+        self._set_status("Playing back...")
         print("Playback scheduled.")
 
     def _on_stop_clicked(self):
@@ -250,7 +430,7 @@ class MainWindow(QMainWindow):
 
         self.playback_timers.clear()
 
-        self.placeholder_label.setText("Playback stopped.")
+        self._set_status("Playback stopped.")
 
     def _on_record_toggled(self, checked: bool):
         if checked:
@@ -262,7 +442,7 @@ class MainWindow(QMainWindow):
             self.record_start_time = time.monotonic()
             self.recorded_messages.clear()
 
-            self.placeholder_label.setText(
+            self._set_status(
                 "Recording...\n"
                 "Incoming MIDI from the selected input will be stored."
             )
@@ -277,37 +457,57 @@ class MainWindow(QMainWindow):
             print("\n=== Recording Summary ===")
             print(summary)
 
-            self.placeholder_label.setText(summary)
+            self._set_status(summary)
 
     def _on_output_changed(self, name: str):
-        # Ignore placeholder / no-devices entries
-        if not name or name in ("Select MIDI Output", "No MIDI outputs"):
+        # Placeholders are not items; they read as ""
+        if not name:
+            self._out_debounce.stop()
+            return
+
+        self._pending_out_name = name
+        self._out_debounce.start()
+
+    def _apply_output_change(self):
+        name = self._pending_out_name
+        self._pending_out_name = None
+        if not name or name != self.output_combo.currentText():
             return
 
         ok = self.midi_manager.select_output(name)
         if ok:
-            self.placeholder_label.setText(f"Selected MIDI output:\n{name}")
+            self._set_status(f"Selected MIDI output:\n{name}")
         else:
-            self.placeholder_label.setText(f"Failed to open MIDI output:\n{name}")
+            self._set_status(f"Failed to open MIDI output:\n{name}")
 
     def _on_input_changed(self, name: str):
-        # Ignore placeholder / no-devices entries
-        if not name or name in ("Select MIDI Input", "No MIDI inputs"):
+        # Placeholders are not items; they read as ""
+        if not name:
+            self._in_debounce.stop()
+            return
+
+        self._pending_in_name = name
+        self._in_debounce.start()
+
+    def _apply_input_change(self):
+        name = self._pending_in_name
+        self._pending_in_name = None
+        if not name or name != self.input_combo.currentText():
             return
 
         ok = self.midi_manager.select_input(name, callback=self._on_midi_message)
         if ok:
-            self.placeholder_label.setText(
+            self._set_status(
                 f"Selected MIDI input:\n{name}\n"
                 "Incoming MIDI will be printed to the console and\n"
                 "recorded when 'Record' is enabled."
             )
         else:
-            self.placeholder_label.setText(f"Failed to open MIDI input:\n{name}")
+            self._set_status(f"Failed to open MIDI input:\n{name}")
 
     def _on_test_note_clicked(self):
-        if self.midi_manager.current_output is None:
-            self.placeholder_label.setText(
+        if self.midi_manager is None or self.midi_manager.current_output is None:
+            self._set_status(
                 "No MIDI output selected.\n"
                 "Choose a device from the 'Out' dropdown first."
             )
@@ -315,22 +515,29 @@ class MainWindow(QMainWindow):
             return
 
         self.midi_manager.send_test_note()
-        self.placeholder_label.setText(
+        self._set_status(
             "Sent test drum note.\n"
             "If nothing is heard, check your MIDI routing."
         )
 
     def _on_refresh_midi_clicked(self):
+        if self.midi_manager is None:
+            print("Retrying MIDI initialization...")
+            self._start_midi_init()
+            return
+
         print("Refreshing MIDI inputs/outputs...")
-        self._refresh_midi_outputs()
-        self._refresh_midi_inputs()
-        self._log_available_midi_ports()
-        self.placeholder_label.setText(
-            "Refreshed MIDI ports.\n"
-        )
+        self.midi_manager.invalidate_port_cache()
+        self._set_status("Scanning MIDI ports...")
+        self._start_port_scan()
+
+    def _drain_midi(self):
+        # Forwards queued input to _on_midi_message on the GUI thread
+        self.midi_manager.dispatch_pending()
 
     def _on_midi_message(self, message: mido.Message, timestamp: float):
-        # This is called from a background thread by mido via MidiManager.
+        # Called on the GUI thread by _drain_midi; the timestamp was taken
+        # on mido's thread when the message arrived.
         if message.type != "note_on" or message.velocity <= 0:
             return
 
@@ -364,7 +571,7 @@ class MainWindow(QMainWindow):
     
     def _on_midi_hit_visual(self, note: int, velocity: int):
         self.hit_count += 1
-        self.placeholder_label.setText(
+        self._set_status(
             f"Last hit:\n"
             f"Note: {note}\n"
             f"Velocity: {velocity}\n"
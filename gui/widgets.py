@@ -0,0 +1,23 @@
+from typing import Callable
+
+from PySide6.QtWidgets import QComboBox
+
+
+class MidiComboBox(QComboBox):
+    """
+    Combo box that (re)populates its MIDI port list right before the
+    dropdown opens, so ports are only enumerated on user interaction.
+    """
+
+    def __init__(self, populate: Callable[[], None] | None = None, parent=None):
+        super().__init__(parent)
+        self.populate = populate
+
+    def showPopup(self):
+        if self.populate is not None:
+            self.populate()
+
+        # Populating may have found no ports and disabled the combo
+        if not self.isEnabled() or self.count() == 0:
+            return
+        super().showPopup()
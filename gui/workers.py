@@ -0,0 +1,63 @@
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+
+class PortEnumSignals(QObject):
+    # MidiManager constructed by the worker
+    manager_ready = Signal(object)
+    # Error message if the MidiManager could not be constructed
+    manager_failed = Signal(str)
+    # (output port names, input port names)
+    ports_ready = Signal(list, list)
+
+
+class PortEnumWorker(QRunnable):
+    """
+    Enumerates MIDI ports on a QThreadPool thread.
+
+    Backend enumeration can take seconds on some drivers, so it must not
+    run on the GUI thread. Results are delivered via signals.ports_ready,
+    which Qt queues back to the receiver's (GUI) thread.
+
+    With midi_manager=None the worker first imports and constructs the
+    MidiManager (RtMidi setup can be slow too) and emits manager_ready,
+    or manager_failed if that raises. list_ports=False stops after that.
+    """
+
+    def __init__(self, midi_manager=None, list_ports: bool = True):
+        super().__init__()
+        self.midi_manager = midi_manager
+        self.list_ports = list_ports
+        self.signals = PortEnumSignals()
+
+    def run(self):
+        if self.midi_manager is None:
+            try:
+                from midi.midi_manager import MidiManager
+                self.midi_manager = MidiManager()
+            except Exception as e:
+                print(f"Error initializing MIDI: {e}")
+                self.signals.manager_failed.emit(str(e))
+                return
+            self.signals.manager_ready.emit(self.midi_manager)
+
+        if not self.list_ports:
+            return
+
+        out_ports = self.midi_manager.list_output_ports()
+        in_ports = self.midi_manager.list_input_ports()
+        self.signals.ports_ready.emit(out_ports, in_ports)
+
+
+class PortCloseWorker(QRunnable):
+    """
+    Closes detached MIDI port handles on a QThreadPool thread, since
+    driver teardown can block for a noticeable time.
+    """
+
+    def __init__(self, ports: list):
+        super().__init__()
+        self.ports = ports
+
+    def run(self):
+        from midi.midi_manager import MidiManager
+        MidiManager.close_ports(self.ports)
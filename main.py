@@ -1,5 +1,6 @@
 import sys
 from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QThreadPool
 from gui.main_window import MainWindow
 
 def main():
@@ -8,7 +9,11 @@ def main():
     window = MainWindow()
     window.show()
 
-    sys.exit(app.exec())
+    exit_code = app.exec()
+
+    # Let background MIDI work (e.g. port teardown) finish before exiting
+    QThreadPool.globalInstance().waitForDone()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,18 @@
 import mido
+import os
+import sys
 import time
+from collections import OrderedDict, deque
+
+try:
+    import rtmidi
+except ImportError:
+    rtmidi = None
+
+
+def _noop_callback(message, ts):
+    pass
+
 
 class MidiManager:
     """
@@ -9,64 +22,194 @@ class MidiManager:
     - can send a simple test drum note to the output
     """
 
-    def __init__(self):
+    # Max number of output ports kept open for quick switching
+    MAX_OPEN = 4
+
+    # mido backends to try, fastest to enumerate first. The first one that
+    # loads is used. Slow or legacy stacks (e.g. portmidi/pygame, which can
+    # sit on DirectMusic/WinMM) belong at the end, if listed at all.
+    # Ignored when MIDO_BACKEND is set in the environment.
+    if sys.platform.startswith("linux"):
+        BACKEND_PREFERENCE = (
+            "mido.backends.rtmidi/LINUX_ALSA",
+            "mido.backends.rtmidi",
+        )
+    else:
+        BACKEND_PREFERENCE = (
+            "mido.backends.rtmidi",
+        )
+
+    # Fixed attribute set; avoids a per-instance __dict__ on the input path
+    __slots__ = (
+        "current_output_name",
+        "current_output",
+        "_current_output_rtmidi",
+        "_open_outputs",
+        "_test_note_msg",
+        "current_input_name",
+        "current_input",
+        "input_callback",
+        "_dispatch",
+        "_mono",
+        "_in_queue",
+        "_out_cache",
+        "_in_cache",
+        "_cache_ttl",
+        "_out_ts",
+        "_in_ts",
+        "_rtmidi_out",
+        "_rtmidi_in",
+    )
+
+    def __init__(self, backends=None):
+        # Pick the backend before anything asks mido for ports
+        self._select_backend(backends or self.BACKEND_PREFERENCE)
+
         # Output
         self.current_output_name = None
         self.current_output = None
+        # Raw-bytes send function for current_output (see send_raw)
+        self._current_output_rtmidi = None
+        # Recently used output ports, least recently used first
+        self._open_outputs = OrderedDict()
+
+        # Test note message, built once (General MIDI: channel 0, note 60).
+        # send() doesn't mutate it, so it can be reused as-is.
+        self._test_note_msg = mido.Message("note_on", channel=0, note=60, velocity=100)
 
         # Input
         self.current_input_name = None
         self.current_input = None
 
-        # Input callback
+        # Input callback; _dispatch is the same callback, or a no-op, so the
+        # per-message path never needs a None check
         self.input_callback = None
+        self._dispatch = _noop_callback
+        self._mono = time.monotonic
+
+        # Incoming (message, timestamp) pairs, filled by mido's thread and
+        # drained by dispatch_pending() on the GUI thread. deque.append and
+        # popleft are atomic, so no lock is needed.
+        self._in_queue = deque(maxlen=4096)
+
+        # Port list cache (backend enumeration can be slow)
+        self._out_cache = None
+        self._in_cache = None
+        self._cache_ttl = 2.0
+        self._out_ts = 0.0
+        self._in_ts = 0.0
+
+        # Long-lived RtMidi clients used only for listing ports; mido
+        # creates a fresh client on every get_*_names() call.
+        self._rtmidi_out = None
+        self._rtmidi_in = None
+        self._create_rtmidi_clients()
 
     # Output
 
     def list_output_ports(self):
         """Return a list of available MIDI output port names."""
+        now = time.monotonic()
+        if self._out_cache is not None and now - self._out_ts < self._cache_ttl:
+            return list(self._out_cache)
+
         try:
-            ports = mido.get_output_names()
+            if self._rtmidi_out is not None:
+                ports = self._rtmidi_out.get_ports()
+            else:
+                ports = mido.get_output_names()
         except Exception as e:
+            # Not cached, so drop_stale_outputs() won't treat it as "no ports"
             print(f"Error listing MIDI output ports: {e}")
-            ports = []
+            self._out_cache = None
+            return []
+
+        self._out_cache = list(ports)
+        self._out_ts = now
         return ports
 
-    def select_output(self, name: str) -> bool:
-        """Open the given MIDI output port by name."""
-        # Close any existing port
-        if self.current_output is not None:
+    def drop_stale_outputs(self):
+        """
+        Close cached output handles whose device was missing from the last
+        successful enumeration. Call from the thread that uses the outputs
+        (the GUI), not from the enumeration worker.
+        """
+        if self._out_cache is None:
+            return
+
+        for name in [n for n in self._open_outputs if n not in self._out_cache]:
+            port = self._open_outputs.pop(name)
+            if port is self.current_output:
+                self.current_output = None
+                self.current_output_name = None
+                self._current_output_rtmidi = None
             try:
-                self.current_output.close()
+                port.close()
             except Exception:
                 pass
-            self.current_output = None
-            self.current_output_name = None
+            print(f"Closed MIDI output (no longer listed): {name}")
+
+    def select_output(self, name: str) -> bool:
+        """Open the given MIDI output port by name."""
+        # Already open; avoid a needless close/reopen round-trip
+        if (
+            name
+            and name == self.current_output_name
+            and self.current_output is not None
+            and not self.current_output.closed
+        ):
+            return True
+
+        # Previously open ports stay in the cache until evicted
+        self.current_output = None
+        self.current_output_name = None
+        self._current_output_rtmidi = None
 
         if not name:
             return False
 
-        try:
-            self.current_output = mido.open_output(name)
+        # Reuse a recently opened port, unless it has been closed under us
+        port = self._open_outputs.get(name)
+        if port is not None and port.closed:
+            del self._open_outputs[name]
+        elif port is not None:
+            self._open_outputs.move_to_end(name)
+            self.current_output = port
             self.current_output_name = name
-            print(f"Opened MIDI output: {name}")
+            self._current_output_rtmidi = self._raw_sender(port)
+            print(f"Reusing MIDI output: {name}")
             return True
+
+        try:
+            port = mido.open_output(name)
         except Exception as e:
             print(f"Error opening MIDI output {name}: {e}")
-            self.current_output = None
-            self.current_output_name = None
             return False
 
+        self._open_outputs[name] = port
+        self.current_output = port
+        self.current_output_name = name
+        self._current_output_rtmidi = self._raw_sender(port)
+        print(f"Opened MIDI output: {name}")
+
+        # Evict the least recently used port
+        if len(self._open_outputs) > self.MAX_OPEN:
+            old_name, old_port = self._open_outputs.popitem(last=False)
+            try:
+                old_port.close()
+            except Exception:
+                pass
+            print(f"Closed MIDI output: {old_name}")
+
+        return True
+
     def send_test_note(self):
         """Send a single test drum hit (kick) to the current output."""
         if self.current_output is None:
             print("No MIDI output selected / open.")
             return
 
-        # General MIDI: channel 0 test note
-        msg_on = mido.Message("note_on", channel=0, note=60, velocity=100)
-
-        self.current_output.send(msg_on)
+        self.current_output.send(self._test_note_msg)
         print("Sent test drum note (note 60).")
 
     def send_message(self, msg: mido.Message):
@@ -76,19 +219,136 @@ class MidiManager:
         
         self.current_output.send(msg)
 
+    def send_raw(self, data):
+        """
+        Send already-encoded MIDI bytes to the current output. Skips mido's
+        per-message encoding; intended for realtime paths.
+        """
+        if self._current_output_rtmidi is None:
+            print("No MIDI output selected / open")
+            return
+
+        self._current_output_rtmidi(data)
+
+    @staticmethod
+    def _raw_sender(port):
+        """Return a function that sends raw bytes to the given mido port."""
+        # mido's rtmidi backend keeps the rtmidi.MidiOut as `_rt`
+        rt = getattr(port, "_rt", None)
+        if rt is not None and hasattr(rt, "send_message"):
+            return rt.send_message
+
+        # Other backends: decode and go through mido
+        return lambda data: port.send(mido.Message.from_bytes(data))
+
     # Input
 
     def list_input_ports(self):
         """Return a list of available MIDI input port names."""
+        now = time.monotonic()
+        if self._in_cache is not None and now - self._in_ts < self._cache_ttl:
+            return list(self._in_cache)
+
         try:
-            ports = mido.get_input_names()
+            if self._rtmidi_in is not None:
+                ports = self._rtmidi_in.get_ports()
+            else:
+                ports = mido.get_input_names()
         except Exception as e:
+            # Not cached, so drop_stale_input() won't treat it as "no ports"
             print(f"Error listing MIDI input ports: {e}")
-            ports = []
+            self._in_cache = None
+            return []
+
+        self._in_cache = list(ports)
+        self._in_ts = now
         return ports
 
+    def drop_stale_input(self):
+        """
+        Close the current input if its device was missing from the last
+        successful enumeration, so selecting it again reopens the port.
+        Call from the GUI thread, like drop_stale_outputs().
+        """
+        if self._in_cache is None or self.current_input is None:
+            return
+        if self.current_input_name in self._in_cache:
+            return
+
+        name = self.current_input_name
+        port = self.current_input
+        self.current_input = None
+        self.current_input_name = None
+        self._set_input_callback(None)
+        self._in_queue.clear()
+        try:
+            port.close()
+        except Exception:
+            pass
+        print(f"Closed MIDI input (no longer listed): {name}")
+
+    # Port enumeration
+
+    @staticmethod
+    def _select_backend(backends):
+        """Set the first mido backend from `backends` that can be loaded."""
+        if os.environ.get("MIDO_BACKEND"):
+            return
+
+        for name in backends:
+            try:
+                backend = mido.Backend(name, load=True, use_environ=False)
+                # rtmidi APIs are only usable if compiled into python-rtmidi
+                api_names = getattr(backend.module, "get_api_names", None)
+                if backend.api and api_names is not None and backend.api not in api_names():
+                    continue
+            except Exception as e:
+                print(f"MIDI backend {name} unavailable: {e}")
+                continue
+
+            mido.set_backend(backend)
+            print(f"Using MIDI backend: {name}")
+            return
+
+        print("No preferred MIDI backend available, using mido default.")
+
+    def _create_rtmidi_clients(self):
+        """Create the RtMidi listing clients if mido uses the rtmidi backend."""
+        backend = mido.backend
+        # Exact match: mido.backends.rtmidi_python wraps a different package
+        if rtmidi is None or backend.name != "mido.backends.rtmidi":
+            return
+
+        api = getattr(rtmidi, f"API_{backend.api}", None) if backend.api else None
+        try:
+            if api is None:
+                self._rtmidi_out = rtmidi.MidiOut()
+                self._rtmidi_in = rtmidi.MidiIn()
+            else:
+                self._rtmidi_out = rtmidi.MidiOut(rtapi=api)
+                self._rtmidi_in = rtmidi.MidiIn(rtapi=api)
+        except Exception as e:
+            print(f"Error creating RtMidi clients, falling back to mido: {e}")
+            self._rtmidi_out = None
+            self._rtmidi_in = None
+
+    def invalidate_port_cache(self):
+        """Forget cached port lists so the next list_* call re-enumerates."""
+        self._out_cache = None
+        self._in_cache = None
+
     def select_input(self, name: str, callback=None) -> bool:
         """Open the given MIDI input port by name, printing incoming messages."""
+        # Already open; just update the callback instead of reopening
+        if (
+            name
+            and name == self.current_input_name
+            and self.current_input is not None
+            and not self.current_input.closed
+        ):
+            self._set_input_callback(callback)
+            return True
+
         # Close any existing port
         if self.current_input is not None:
             try:
@@ -97,12 +357,13 @@ class MidiManager:
                 pass
             self.current_input = None
             self.current_input_name = None
-            self.input_callback = None
+            self._set_input_callback(None)
+            self._in_queue.clear()
 
         if not name:
             return False
         
-        self.input_callback = callback
+        self._set_input_callback(callback)
 
         try:
             # Use a callback that only prints
@@ -114,36 +375,68 @@ class MidiManager:
             print(f"Error opening MIDI input {name}: {e}")
             self.current_input = None
             self.current_input_name = None
-            self.input_callback = None
+            self._set_input_callback(None)
             return False
 
+    def _set_input_callback(self, callback):
+        self.input_callback = callback
+        self._dispatch = callback if callback is not None else _noop_callback
+
     def _handle_input_message(self, message: mido.Message):
         """This is called from a background thread by mido."""
-        ts = time.monotonic();
-        # print(f"MIDI IN [{self.current_input_name}] @ {ts:.3f}: {message}")
+        # print(f"MIDI IN [{self.current_input_name}]: {message}")
+        self._in_queue.append((message, self._mono()))
 
-        if self.input_callback is not None:
+    def dispatch_pending(self, limit: int = 256) -> int:
+        """
+        Pass up to `limit` queued input messages to the input callback.
+        Call this from the thread that should run the callback (the GUI).
+        Returns the number of messages handled.
+        """
+        queue = self._in_queue
+        dispatch = self._dispatch
+        count = 0
+        while queue and count < limit:
+            message, ts = queue.popleft()
+            count += 1
             try:
-                self.input_callback(message, ts)
+                dispatch(message, ts)
             except Exception as e:
                 print(f"Error in input_callback: {e}")
+        return count
 
     # Cleanup
 
-    def close_all(self):
-        """Close any open input/output ports."""
-        if self.current_output is not None:
-            try:
-                self.current_output.close()
-            except Exception:
-                pass
-            self.current_output = None
-            self.current_output_name = None
-
+    def detach_ports(self) -> list:
+        """
+        Forget all open ports without closing them and return the handles,
+        input first so callbacks stop before outputs go away. The caller
+        is responsible for closing them (see close_ports).
+        """
+        ports = []
         if self.current_input is not None:
+            ports.append(self.current_input)
+        self.current_input = None
+        self.current_input_name = None
+        self._set_input_callback(None)
+        self._in_queue.clear()
+
+        ports.extend(self._open_outputs.values())
+        self._open_outputs = OrderedDict()
+        self.current_output = None
+        self.current_output_name = None
+        self._current_output_rtmidi = None
+        return ports
+
+    @staticmethod
+    def close_ports(ports: list):
+        """Close the given port handles, ignoring errors. May block."""
+        for port in ports:
             try:
-                self.current_input.close()
+                port.close()
             except Exception:
                 pass
-            self.current_input = None
-            self.current_input_name = None
+
+    def close_all(self):
+        """Close any open input/output ports."""
+        self.close_ports(self.detach_ports())